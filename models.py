@@ -1,11 +1,125 @@
 import math
-import random
+import os
+from concurrent.futures import ThreadPoolExecutor
 from time import time
 
 import numpy as np
 
 from typing import Callable
 
+try:
+    from numba import njit
+    _has_numba = True
+except ImportError:
+    _has_numba = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit when numba is not installed. Returns the
+        decorated function unchanged.
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+try:
+    import cupy
+except ImportError:
+    cupy = None
+
+try:
+    from scipy.spatial import cKDTree
+    from scipy.spatial.distance import cdist
+except ImportError:
+    cKDTree = None
+    cdist = None
+
+
+@njit(cache=True, nogil=True)
+def _pocket(X, y, w, b, m, w_best, b_best, E_best, r, n_iter, G, idx):
+    """
+    Pocket perceptron learning algorithm, resumed from the current weight
+    vector w, intercept b and margins m. Runs until n_iter updates are done,
+    no point is misclassified, or the draws in idx run out. w, m and w_best
+    are updated in place.
+
+    Parameters
+    ----------
+    X : numpy.ndarray (2 dimensional)
+        Training data.
+    y : numpy.ndarray (1 dimensional)
+        Labels for training data.
+    w : numpy.ndarray
+        Current weight vector.
+    b : float
+        Current intercept.
+    m : numpy.ndarray (1 dimensional)
+        Current margins X @ w + b.
+    w_best : numpy.ndarray
+        Best weight vector found so far.
+    b_best : float
+        Best intercept found so far.
+    E_best : float
+        In-sample error of w_best and b_best.
+    r : float
+        Regularization coefficient.
+    n_iter : int
+        Maximum number of weight updates to perform.
+    G : numpy.ndarray (2 dimensional)
+        Gram matrix X @ X.T, or an empty array to compute its rows on demand.
+    idx : numpy.ndarray (1 dimensional)
+        Random indices into X, consumed in order to pick the points to check.
+
+    Returns
+    -------
+    (float, float, float, int, int)
+        The current and best intercept, the in-sample error of the best
+        weights, the number of updates performed and the number of points
+        still misclassified.
+    """
+    mis = np.sum((m >= 0) != (y >= 0))
+    p = 0
+    t = 0
+    while t < n_iter and mis > 0:
+        # pick random points until one is misclassified
+        while p < len(idx) and (m[idx[p]] >= 0) == (y[idx[p]] >= 0):
+            p += 1
+        if p == len(idx):
+            break
+        i = idx[p]
+        p += 1
+        # update w, b, margins and E_in
+        w += y[i] * X[i]
+        b += y[i]
+        if len(G):
+            m += y[i] * (G[i] + 1)
+        else:
+            m += y[i] * (X @ X[i] + 1)
+        mis = np.sum((m >= 0) != (y >= 0))
+        t += 1
+        E_in = mis + r * (w @ w)
+        if E_in < E_best:
+            E_best = E_in
+            w_best[:] = w
+            b_best = b
+    return b, b_best, E_best, t, mis
+
+
+@njit(cache=True)
+def _classify_point(x, w, b):
+    """
+    Classifies x using the weight vector w and intercept b.
+
+    Returns
+    -------
+    int
+         1 if `np.dot(x, w) + b` >= 0; -1 otherwise.
+    """
+    s = b
+    for j in range(len(x)):
+        s += x[j] * w[j]
+    return 1 if s >= 0 else -1
+
 
 class BaseModel(object):
     """
@@ -21,7 +135,8 @@ class BaseModel(object):
         Feature transformation function on an individual point. 
     """
 
-    def __init__(self, X, y, feat_trans=None):
+    def __init__(self, X, y, feat_trans=None, dtype=np.float32,
+                 batched_feat_trans=False):
         """
         Create a new BaseModel.
 
@@ -34,6 +149,12 @@ class BaseModel(object):
         feat_trans: Callable[[numpy.ndarray], numpy.ndarray], optional
             Feature transformation function on an individual point.
             (Default: None, implies no feature transformation)
+        dtype : numpy.dtype, optional
+            Floating point type used to store X and y (Default: float32).
+        batched_feat_trans : bool, optional
+            If True, feat_trans also accepts a 2 dimensional array and
+            transforms each of its rows, so a whole dataset is transformed in
+            one call (Default: False, applied point by point).
 
         Raises
         ------
@@ -44,8 +165,8 @@ class BaseModel(object):
             - If feature transformation fails.
             - If the first column of X is a dummy feature. *WIP*
         """
-        X = np.array(X, dtype='float')
-        y = np.array(y, dtype='float')
+        X = np.ascontiguousarray(X, dtype=dtype)
+        y = np.ascontiguousarray(y, dtype=dtype)
 
         if len(X.shape) != 2:
             raise ValueError(
@@ -57,15 +178,46 @@ class BaseModel(object):
             raise ValueError(
                 f'Unequal dimensions. len(X) ({len(X)}) != len(y) ({len(y)})')
 
-        if feat_trans != None:
-            try:
-                X = np.array([feat_trans(x) for x in X], dtype='float')
-            except e:
-                raise ValueError(f'Feature transform failed\n{e}')
-
-        self.X = X
-        self.y = y
         self.feat_trans = feat_trans
+        self._batched_feat_trans = batched_feat_trans
+        self.X = np.ascontiguousarray(self._apply_feat_trans(X), dtype=dtype)
+        self.y = y
+
+    def _apply_feat_trans(self, X: np.ndarray) -> np.ndarray:
+        """
+        Apply the feature transformation to every point in X, in a single
+        call if feat_trans was declared batched, otherwise point by point.
+
+        Parameters
+        ----------
+        X : numpy.ndarray (2 dimensional)
+            Points to transform.
+
+        Raises
+        ------
+        ValueError
+            If feature transformation fails.
+
+        Returns
+        -------
+        numpy.ndarray (2 dimensional)
+            The feature-transformed points, one row per point in X.
+        """
+        if self.feat_trans is None:
+            return X
+
+        try:
+            if not self._batched_feat_trans:
+                return np.stack([self.feat_trans(x) for x in X])
+            Z = np.asarray(self.feat_trans(X))
+        except Exception as e:
+            raise ValueError(f'Feature transform failed\n{e}')
+
+        if Z.ndim != 2 or len(Z) != len(X):
+            raise ValueError(
+                f'Feature transform failed\n{Z.shape} is invalid shape for '
+                f'batched output. Should be ({len(X)}, ...).')
+        return Z
 
 
 class LinearModel(BaseModel):
@@ -82,17 +234,35 @@ class LinearModel(BaseModel):
         Feature transformation function on an individual point.
     w : numpy.ndarray
         Weight vector of the model.
+    b : float
+        Intercept of the model.
     r : float
         Regularization coefficient for the model.
     """
 
+    # largest training set for which the pocket algorithm precomputes the
+    # full Gram matrix (N x N)
+    _GRAM_MAX_N = 4096
+
+    # number of random point draws generated at a time for the pocket
+    # algorithm; a new block is drawn whenever one runs out
+    _DRAW_BLOCK = 4096
+
+    # largest number of features for which _classify is generated as an
+    # unrolled expression; beyond it the numba loop is faster
+    _UNROLL_MAX_DIM = 4
+
     def __init__(self,
                  X: np.ndarray,
                  y: np.ndarray,
                  r: float = 0,
-                 feat_trans: Callable[[numpy.ndarray], numpy.ndarray] = None,
+                 feat_trans: Callable[[np.ndarray], np.ndarray] = None,
                  n_iter: int = 2000,
-                 debug: bool = False):
+                 debug: bool = False,
+                 dtype: np.dtype = np.float32,
+                 n_jobs: int = 1,
+                 seed: int = None,
+                 batched_feat_trans: bool = False):
         """
         Create a new LinearModel.
 
@@ -110,118 +280,269 @@ class LinearModel(BaseModel):
         n_iter : int, optional
             Number of training iterations (Default: 2000).
         debug : bool, optional
-            Prints out training information if True (default: False).
+            Prints the in-sample error and weights before and after the
+            pocket run if True (default: False).
+        dtype : numpy.dtype, optional
+            Floating point type used to store X and y (Default: float32).
+        n_jobs : int, optional
+            Number of data shards trained in parallel threads, -1 for one
+            per CPU (Default: 1).
+        seed : int, optional
+            Seed for the random number generator used in training
+            (Default: None, seeded from the OS).
+        batched_feat_trans : bool, optional
+            If True, feat_trans also accepts a 2 dimensional array and
+            transforms each of its rows (Default: False).
 
         Raises
         ------
         ValueError
             If conditions for BaseModel are not met.
         """
-        super().__init__(X, y, feat_trans)
-
-        self.X = np.asfarray(np.column_stack(
-            (np.ones_like(self.X.shape[0]), self.X)))
+        super().__init__(X, y, feat_trans, dtype, batched_feat_trans)
         self.r = r
 
         self._debug = debug
         self._n_iter = n_iter
+        self._n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self._rng = np.random.default_rng(seed)
 
-        self.w = self._train_model()
+        self.w, self.b = self._train_model()
+        self._classify = self._specialize_classify()
 
-    def _train_model(self) -> np.ndarray:
+    def _train_model(self):
         """
         Train model on provided data using Linear regression then pocket
         perceptron learning algorithm for improvement.
 
         Returns
         -------
-        numpy.ndarray
-            The weight vector resulting from training.
-        """
-        w_ = self._calc_w_lin()
-        E_ = self._calc_E_in(w_)
-
-        @staticmethod
-        def debug(t):
-            print(f'{time()} | iter: {t} | (E_, w_): {E_, w_}')
-
-        w = np.copy(self.w)
-        for t in range(n_iter):
-            if debug:
-                debug(t)
-            while True:
-                # pick random point and classify
-                i = random.randint(0, len(self.X) - 1)
-                if self._classify(self.X[i], w) != self.y[i]:
-                    # Update w and E_in
-                    w += self.y[i] * self.X[i]
-                    E_in = self._calc_E_in(w)
-                    if E_in < E_:
-                        E_ = E_in
-                        np.copyto(w_, w)
-                    break
-        if debug:
-            debug(self._n_iter)
-
-        return w_
-
-    def _calc_w_lin(self) -> np.ndarray:
+        (numpy.ndarray, float)
+            The weight vector and intercept resulting from training.
+        """
+        w_, b_ = self._calc_w_lin()
+        E_ = self._calc_E_in(w_, b_)
+
+        if self._debug:
+            print(f'{time()} | iter: 0 | (E_, w_, b_): {E_, w_, b_}')
+
+        if self._n_jobs > 1:
+            w_, b_, E_ = self._train_shards(w_, b_, E_)
+        else:
+            w_, b_, E_ = self._run_pocket(self.X, self.y, w_, b_, E_,
+                                          self._rng)
+
+        if self._debug:
+            print(f'{time()} | iter: {self._n_iter} | '
+                  f'(E_, w_, b_): {E_, w_, b_}')
+
+        return w_, float(b_)
+
+    def _train_shards(self, w: np.ndarray, b: float, E: float):
+        """
+        Run the pocket algorithm independently on disjoint shards of the
+        data in parallel, then keep whichever of the shard solutions, their
+        average, or (w, b) has the lowest in-sample error on the full set.
+
+        Parameters
+        ----------
+        w : numpy.ndarray
+            Initial weight vector for every shard.
+        b : float
+            Initial intercept for every shard.
+        E : float
+            In-sample error of w and b.
+
+        Returns
+        -------
+        (numpy.ndarray, float, float)
+            The best weight vector and intercept found, and their in-sample
+            error.
+        """
+        shards = [idx for idx in np.array_split(
+            self._rng.permutation(len(self.X)), self._n_jobs) if len(idx)]
+        # Generator is not thread-safe, so each shard gets its own
+        rngs = [np.random.default_rng(seed) for seed in
+                self._rng.integers(2**63, size=len(shards))]
+
+        def train(idx, rng):
+            X, y = self.X[idx], self.y[idx]
+            E_shard = (np.count_nonzero((X @ w + b >= 0) != (y >= 0)) +
+                       self.r * (w @ w))
+            return self._run_pocket(X, y, w, b, E_shard, rng)[:2]
+
+        with ThreadPoolExecutor(len(shards)) as executor:
+            wb_list = list(executor.map(train, shards, rngs))
+        wb_list.append((np.mean([w_ for w_, _ in wb_list], axis=0),
+                        np.mean([b_ for _, b_ in wb_list])))
+
+        for w_shard, b_shard in wb_list:
+            E_shard = self._calc_E_in(w_shard, b_shard)
+            if E_shard < E:
+                w, b, E = w_shard, b_shard, E_shard
+        return w, b, E
+
+    def _run_pocket(self, X: np.ndarray, y: np.ndarray, w: np.ndarray,
+                    b: float, E: float, rng: np.random.Generator):
+        """
+        Run n_iter updates of the pocket algorithm on X, y starting from w
+        and b, feeding it blocks of _DRAW_BLOCK random point indices.
+
+        Parameters
+        ----------
+        X : numpy.ndarray (2 dimensional)
+            Training data.
+        y : numpy.ndarray (1 dimensional)
+            Labels for training data.
+        w : numpy.ndarray
+            Initial weight vector.
+        b : float
+            Initial intercept.
+        E : float
+            In-sample error of w and b.
+        rng : numpy.random.Generator
+            Source of the random point indices.
+
+        Returns
+        -------
+        (numpy.ndarray, float, float)
+            The best weight vector and intercept found, and their in-sample
+            error.
+        """
+        G = self._gram(X)
+        w_best = w.copy()
+        w = w.copy()
+        m = X @ w + b
+        b, b_best, E = float(b), float(b), float(E)
+        n_left = self._n_iter
+        while n_left > 0:
+            idx = rng.integers(0, len(X), size=self._DRAW_BLOCK)
+            b, b_best, E, t, mis = _pocket(X, y, w, b, m, w_best, b_best, E,
+                                           float(self.r), n_left, G, idx)
+            n_left -= t
+            if mis == 0:
+                break
+        return w_best, b_best, E
+
+    def _gram(self, X: np.ndarray) -> np.ndarray:
+        """
+        Gram matrix of X for incremental margin updates in the pocket
+        algorithm. Empty if X has more than _GRAM_MAX_N points, in which case
+        rows are computed on demand.
+
+        Parameters
+        ----------
+        X : numpy.ndarray (2 dimensional)
+            Training data.
+
+        Returns
+        -------
+        numpy.ndarray (2 dimensional)
+            X @ X.T, or an empty array.
+        """
+        if len(X) > self._GRAM_MAX_N:
+            return np.empty((0, 0), dtype=X.dtype)
+        return X @ X.T
+
+    def _calc_w_lin(self):
         """
         Calculate w_lin, the weight vector from linear regression.
 
         Returns
         -------
-        numpy.ndarray
-            The weight vector from determined by linear regression.
+        (numpy.ndarray, float)
+            The weight vector and intercept determined by linear regression.
         """
-        n = self.X.shape[1]
-        return (np.linalg.inv((self.X.T @ self.X) +
-                               self.r * np.eye(n)) @ self.X.T) @ self.y
+        # centering the data separates out the intercept, which is then
+        # recovered from the means (and is not regularized)
+        X_mean = self.X.mean(axis=0)
+        y_mean = self.y.mean()
+        Xc = self.X - X_mean
 
-    def _calc_E_in(self, w: np.ndarray = None) -> float:
+        # solve (Xc^T Xc + rI) w = Xc^T y rather than forming the inverse
+        A = Xc.T @ Xc
+        A.flat[::A.shape[0] + 1] += self.r
+        w = np.linalg.solve(A, Xc.T @ (self.y - y_mean))
+        return w, float(y_mean - X_mean @ w)
+
+    def _calc_E_in(self, w: np.ndarray = None, b: float = None) -> float:
         """
-        Calculate in-sample error for specified weight vector.
+        Calculate in-sample error for specified weight vector and intercept.
 
         Parameters
         ----------
         w : numpy.ndarray, optional
             Weight vector for calculating E_in
             (Default: None, uses model's weight vector)
+        b : float, optional
+            Intercept for calculating E_in
+            (Default: None, uses model's intercept)
 
         Returns
         -------
         float
             In-sample error, E_in, for the provided weight vector.
         """
-        w = w if w != None else self.w
-        pred = self.X @ w
-        pred[pred >= 0] = 1
-        pred[pred < 0] = -1
-        return np.sum(np.abs(pred - self.y) / 2) + self.r * (w @ w)
+        w = w if w is not None else self.w
+        b = b if b is not None else self.b
+        # count points whose predicted sign differs from their label
+        mis = np.count_nonzero((self.X @ w + b >= 0) != (self.y >= 0))
+        return mis + self.r * (w @ w)
 
-    def _classify(self, x, w) -> int:
+    def _classify(self, x, w, b) -> int:
         """
-        Classifies x using the weight vector w.
+        Classifies x using the weight vector w and intercept b.
         Assumes x has already gone through feature transformation.
 
         Parameters
         ----------
         x : numpy.ndarray
             Point to classify
-        w : numpy.ndarray, optional
+        w : numpy.ndarray
             Weight vector to use for classification
-            (Default: None, uses model's weight vector)
+        b : float
+            Intercept to use for classification
 
         Returns
         -------
         int
-             1 if `np.dot(x, w)` >= 0; -1 otherwise.
+             1 if `np.dot(x, w) + b` >= 0; -1 otherwise.
         """
-        return 1 if np.dot(x, w) >= 0 else -1
+        return 1 if np.dot(x, w) + b >= 0 else -1
 
-    def classify(self, x: np.ndarray, w: np.ndarray = None) -> int:
+    def _specialize_classify(self) -> Callable:
         """
-        Classifies x using the weight vector w.
+        Build a version of _classify specialized to the number of features.
+        For few features the dot product is generated at runtime as an
+        unrolled expression over Python floats, avoiding NumPy's per-call
+        overhead; otherwise the numba compiled loop is used, if available.
+
+        Returns
+        -------
+        Callable[[numpy.ndarray, numpy.ndarray, float], int]
+            Function with the signature of _classify (without self).
+        """
+        d = len(self.w)
+        if d > self._UNROLL_MAX_DIM:
+            return _classify_point if _has_numba else self._classify
+
+        xs = ''.join(f'x{j}, ' for j in range(d))
+        ws = ''.join(f'w{j}, ' for j in range(d))
+        dot = ' + '.join(f'x{j} * w{j}' for j in range(d))
+        src = (f'def _classify(x, w, b):\n'
+               f'    {xs}= x.tolist()\n'
+               f'    {ws}= w.tolist()\n'
+               f'    return 1 if {dot} + b >= 0 else -1\n')
+        namespace = {}
+        exec(src, namespace)
+        return namespace['_classify']
+
+    def classify(self,
+                 x: np.ndarray,
+                 w: np.ndarray = None,
+                 b: float = None) -> int:
+        """
+        Classifies x using the weight vector w and intercept b.
         Will perform feature transformation on x if self.feat_trans != None.
 
         Parameters
@@ -231,6 +552,9 @@ class LinearModel(BaseModel):
         w : numpy.ndarray, optional
             Weight vector to use for classification
             (Default: None, uses model's weight vector)
+        b : float, optional
+            Intercept to use for classification
+            (Default: None, uses model's intercept)
 
         Raises
         ------
@@ -240,17 +564,19 @@ class LinearModel(BaseModel):
         Returns
         -------
         int
-             1 if `np.dot(x, w)` >= 0; -1 otherwise.
+             1 if `np.dot(x, w) + b` >= 0; -1 otherwise.
         """
+        w = np.asarray(w if w is not None else self.w, dtype=self.X.dtype)
+        b = b if b is not None else self.b
         # feature transformation
         if self.feat_trans != None:
-            try:
-                x = self.feat_trans(x)
-            except e:
-                raise ValueError(f'Feature transform failed\n{e}')
-        return self._classify(x, w)
+            x = self._apply_feat_trans(np.asarray(x)[None, :])[0]
+        return self._classify(np.asarray(x, dtype=self.X.dtype), w, b)
 
-    def classify_all(self, X: np.ndarray, w: np.ndarray = None):
+    def classify_all(self,
+                     X: np.ndarray,
+                     w: np.ndarray = None,
+                     b: float = None):
         """
         Classify a collection of points.
 
@@ -259,8 +585,11 @@ class LinearModel(BaseModel):
         X : numpy.ndarray
             Points to classify
         w : numpy.ndarray, optional
-            Weight vector for calculating E_in
+            Weight vector to use for classification
             (Default: None, uses model's weight vector)
+        b : float, optional
+            Intercept to use for classification
+            (Default: None, uses model's intercept)
 
         Raises
         ------
@@ -272,17 +601,11 @@ class LinearModel(BaseModel):
         numpy.ndarray
             Predicted labels for the points in X
         """
-        w = w if w != None else self.w
-        if self.feat_trans != None:
-            try:
-                X = np.array([self.feat_trans(x) for x in X])
-            except e:
-                raise ValueError(f'Feature transform failed\n{e}')
+        w = w if w is not None else self.w
+        b = b if b is not None else self.b
+        X = self._apply_feat_trans(X)
 
-        pred = X @ w
-        pred[pred >= 0] = 1
-        pred[pred < 0] = -1
-        return pred
+        return np.where(X @ w + b >= 0, 1, -1)
 
 
 class kNNModel(BaseModel):
@@ -301,7 +624,19 @@ class kNNModel(BaseModel):
         Number of nearest neighbors to check.
     """
 
-    def __init__(self, X: np.ndarray, y: np.ndarray, k: int = 1):
+    # highest dimension for which neighbors are found with a KD-tree rather
+    # than brute force
+    _TREE_MAX_DIM = 20
+
+    # number of query points whose brute force distances are held in memory
+    # at once
+    _BLOCK_SIZE = 1024
+
+    def __init__(self,
+                 X: np.ndarray,
+                 y: np.ndarray,
+                 k: int = 1,
+                 dtype: np.dtype = np.float32):
         """
         Create a new kNNModel
 
@@ -313,33 +648,77 @@ class kNNModel(BaseModel):
             Vector containing labels for data points in X.
         k : int, optional
             Number of nearest neighbors to check (Default : 1)
+        dtype : numpy.dtype, optional
+            Floating point type used to store X and y (Default: float32).
 
         Raises
         ------
         ValueError
             If conditions for BaseModel are not met.
         """
-        super().__init__(X, y)
+        super().__init__(X, y, dtype=dtype)
         self.k = k
+        self._tree = None
+        if cKDTree is not None and self.X.shape[1] <= self._TREE_MAX_DIM:
+            self._tree = cKDTree(self.X)
+        else:
+            # brute force distances are expanded on data centered at the
+            # training mean, so offset data does not cancel out in float32
+            self._X_mean = self.X.mean(axis=0)
+            self._Xc = self.X - self._X_mean
+            self._X_sq = np.einsum('ij,ij->i', self._Xc, self._Xc)
+
+    def _nearest(self, X: np.ndarray, k: int) -> np.ndarray:
+        """
+        Find the k nearest neighbors in the model's X of each point in X.
+        Uses the KD-tree for low dimensional data, otherwise brute force
+        distances and a linear-time partition instead of a full sort.
 
-    @staticmethod
-    def _euclidean_distance(x1: np.ndarray, x2: np.ndarray) -> float:
+        Parameters
+        ----------
+        X : numpy.ndarray (2 dimensional)
+            Points to find neighbors for.
+        k : int
+            Number of nearest neighbors to find.
+
+        Returns
+        -------
+        numpy.ndarray (2 dimensional)
+            Indices into the model's X, one row per point in X.
+        """
+        k = min(k, len(self.X))
+
+        if self._tree is not None:
+            _, idx = self._tree.query(X, k=k, workers=-1)
+            return idx.reshape(len(X), k)
+
+        # pairwise squared distances are |x|^2 + |x_i|^2 - 2 x.x_i; |x|^2 is
+        # the same for a whole row, so it does not change the neighbors
+        idx = np.empty((len(X), k), dtype=np.intp)
+        for start in range(0, len(X), self._BLOCK_SIZE):
+            block = X[start:start + self._BLOCK_SIZE] - self._X_mean
+            D2 = block @ self._Xc.T
+            D2 *= -2.0
+            D2 += self._X_sq[None, :]
+            idx[start:start + len(block)] = np.argpartition(
+                D2, k - 1, axis=1)[:, :k]
+        return idx
+
+    def _vote(self, idx: np.ndarray) -> np.ndarray:
         """
-        Returns distance between two points.
+        Majority vote of the neighbors in each row of idx.
 
         Parameters
         ----------
-        x1 : numpy.ndarray
-            First point.
-        x2 : numpy.ndarray
-            Second point.
+        idx : numpy.ndarray (2 dimensional)
+            Indices into the model's X of each point's neighbors.
 
         Returns
         -------
-        float
-            Euclidean distance between x1 and x2.
+        numpy.ndarray
+             1 where the neighbors have labels >= 0; -1 otherwise.
         """
-        return np.linalg.norm(x1 - x2)
+        return np.where(self.y[idx].sum(axis=1) >= 0, 1, -1)
 
     def classify(self, x: np.ndarray, k: int = None) -> int:
         """
@@ -368,18 +747,10 @@ class kNNModel(BaseModel):
 
         # feature transformation
         if self.feat_trans != None:
-            try:
-                x = self.feat_trans(x)
-            except e:
-                raise ValueError(f'Feature transform failed\n{e}')
-
-        # get distance to each point in X, then sort
-        distances = sorted((self._euclidean_distance(x, self.X[i]), self.y[i])
-                           for i in range(len(self.X)))
+            x = self._apply_feat_trans(np.asarray(x)[None, :])[0]
 
-        # get k nearest neighbors, then take the sum of the labels
-        nearest_neighbors = distances[:k]
-        return 1 if sum(label for _, label in nearest_neighbors) >= 0 else -1
+        x = np.asarray(x, dtype=self.X.dtype)
+        return int(self._vote(self._nearest(x[None, :], k))[0])
 
     def classify_all(self, X: np.ndarray, k: int = None):
         """
@@ -393,6 +764,11 @@ class kNNModel(BaseModel):
             Number of nearest neighbors to check.
             (Default: None, uses model's k attribute).
 
+        Raises
+        ------
+        ValueError
+            If feature transformation fails.
+
         Returns
         -------
         numpy.ndarray
@@ -401,8 +777,10 @@ class kNNModel(BaseModel):
         # use provided, otherwise use default
         k = k if k != None else self.k
 
-        # classify all and return
-        return np.array([self.classify(x, k) for x in X])
+        # feature transformation
+        X = self._apply_feat_trans(X)
+        X = np.asarray(X, dtype=self.X.dtype)
+        return self._vote(self._nearest(X, k))
 
     def classification_error(self, X: np.ndarray, y: np.ndarray, k: int = None):
         """
@@ -453,12 +831,18 @@ class RBFModel(BaseModel):
         Scaling constant
     """
 
+    # highest dimension for which distances to the centers are computed with
+    # scipy's cdist; above it the matmul expansion is faster
+    _CDIST_MAX_DIM = 8
+
     def __init__(self,
                  X: np.ndarray,
                  y: np.ndarray,
                  Mu: np.ndarray,
                  kern: Callable[[float], float] = None,
-                 r: float = 2):
+                 r: float = 2,
+                 dtype: np.dtype = np.float32,
+                 backend: str = 'numpy'):
         """
         Create a new RBFModel.
 
@@ -474,32 +858,78 @@ class RBFModel(BaseModel):
             Kernel Function used in the feature transform (default: Gaussian).
         r : float, optional
             scaling constant (default: 2).
-        debug : bool, optional
-            Prints out training information if True (default: False).
+        dtype : numpy.dtype, optional
+            Floating point type used to store X and y (Default: float32).
+        backend : str, optional
+            Array library used for the feature transform and the solve,
+            'numpy' or 'cupy' (Default: 'numpy').
 
         Raises
         ------
         ValueError
-            If conditions for BaseModel are not met.
-        """
-        super().__init__(X, y)
+            - If conditions for BaseModel are not met.
+            - If backend is not supported.
+        ImportError
+            If backend is 'cupy' and CuPy is not installed.
+        """
+        super().__init__(X, y, dtype=dtype)
+        if backend == 'numpy':
+            self._xp = np
+        elif backend == 'cupy':
+            if cupy is None:
+                raise ImportError('backend=\'cupy\' requires CuPy')
+            self._xp = cupy
+        else:
+            raise ValueError(
+                f'{backend} is invalid backend. Should be numpy or cupy.')
+
         self.kern = kern if kern != None else self._gaussian_kernel
-        self.Mu = Mu
+        self.Mu = np.ascontiguousarray(Mu, dtype=self.X.dtype)
         self.r = r
+        # kept resident on the backend's device between calls; distances are
+        # taken on data centered at the centers' mean, so offset data does
+        # not cancel out in float32
+        self._Mu_mean = self._xp.asarray(self.Mu.mean(axis=0))
+        self._Mu = self._xp.asarray(self.Mu) - self._Mu_mean
+        self._mu_sq = self._xp.einsum('ij,ij->i', self._Mu, self._Mu)
+        # a Python float, so it does not promote float32 arrays
+        self._inv_r2 = float(1.0 / (self.r * self.r))
         self.feat_trans = self._feat_trans
-        self.X = np.array([self.feat_trans(x) for x in X])
-        self.w = self._calc_w_lin()
 
-    def _calc_w_lin(self) -> np.ndarray:
+        Z = self._feat_trans_batch(self.X)
+        self._w = self._calc_w_lin(Z)
+        self.X = self._to_host(Z)
+        self.w = self._to_host(self._w)
+
+    def _to_host(self, a) -> np.ndarray:
+        """
+        Copy an array of the model's backend to a numpy.ndarray.
+        """
+        return a if self._xp is np else self._xp.asnumpy(a)
+
+    def _calc_w_lin(self, Z=None):
         """
         Calculate w_lin, the weight vector from linear regression.
 
+        Parameters
+        ----------
+        Z : array of the model's backend (2 dimensional), optional
+            Feature-transformed training data
+            (Default: None, uses model's X).
+
         Returns
         -------
-        numpy.ndarray
+        array of the model's backend
             The weight vector from determined by linear regression.
         """
-        return (np.linalg.inv(self.X.T @ self.X) @ self.X.T) @ self.y
+        # Z is kept in the model's dtype, but the solve and the weights are
+        # float64: RBF design matrices are often badly conditioned, so the
+        # least squares problem is solved directly, never as Z^T Z w = Z^T y
+        xp = self._xp
+        Z = Z if Z is not None else xp.asarray(self.X)
+        return xp.linalg.lstsq(Z.astype(xp.float64),
+                               xp.asarray(self.y, dtype=xp.float64),
+                               rcond=None)[0]
 
     def _feat_trans(self, x: np.ndarray):
         """
@@ -521,10 +951,43 @@ class RBFModel(BaseModel):
         numpy.ndarray
             The feature-transformed version of x.
         """
-        z = [1]
-        for i in range(len(self.Mu)):
-            z.append(self.kern(np.linalg.norm(x - self.Mu[i])/self.r))
-        return np.array(z)
+        x = np.asarray(x, dtype=self.Mu.dtype)
+        return self._to_host(self._feat_trans_batch(x[None, :])[0])
+
+    def _feat_trans_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        RBF feature transformation of every point in X at once.
+
+        Parameters
+        ----------
+        X : numpy.ndarray (2 dimensional)
+            Points to transform.
+
+        Returns
+        -------
+        array of the model's backend (2 dimensional)
+            The feature-transformed points, one row per point in X.
+        """
+        xp = self._xp
+        X = xp.asarray(X) - self._Mu_mean
+
+        # squared distance from each point to each center
+        if (xp is np and cdist is not None and
+                X.shape[1] <= self._CDIST_MAX_DIM):
+            sqd = cdist(X, self._Mu, 'sqeuclidean').astype(X.dtype)
+        else:
+            sqd = (xp.einsum('ij,ij->i', X, X)[:, None] +
+                   self._mu_sq[None, :] - 2 * (X @ self._Mu.T))
+            xp.maximum(sqd, 0, out=sqd)
+
+        if self.kern is self._gaussian_kernel:
+            Z = xp.exp(-0.5 * sqd * self._inv_r2)
+        else:
+            # arbitrary Python kernels are evaluated on the host
+            Z = np.vectorize(self.kern, otypes=[sqd.dtype])(
+                self._to_host(xp.sqrt(sqd)) / self.r)
+            Z = xp.asarray(Z)
+        return xp.hstack([xp.ones((X.shape[0], 1), dtype=Z.dtype), Z])
 
     @staticmethod
     def _gaussian_kernel(z: float) -> float:
@@ -549,13 +1012,9 @@ class RBFModel(BaseModel):
         numpy.ndarray
             Predicted labels for the points in X using weight vector w
         """
-        if self.feat_trans != None:
-            try:
-                X = np.array([self.feat_trans(x) for x in X])
-            except e:
-                raise ValueError(f'Feature transform failed\n{e}')
-
-        pred = X @ self.w
-        pred[pred >= 0] = 1
-        pred[pred < 0] = -1
-        return pred
+        try:
+            X = self._feat_trans_batch(np.asarray(X, dtype=self.Mu.dtype))
+        except Exception as e:
+            raise ValueError(f'Feature transform failed\n{e}')
+
+        return self._to_host(self._xp.where(X @ self._w >= 0, 1, -1))
@@ -0,0 +1,37 @@
+import types
+
+import numpy as np
+
+import models
+
+
+def _numpy_cupy_stub():
+    """
+    Stand-in for the cupy module backed by numpy, so the cupy code paths
+    can run without a GPU.
+    """
+    stub = types.ModuleType('cupy')
+    stub.__dict__.update({name: getattr(np, name)
+                          for name in dir(np) if not name.startswith('_')})
+    stub.linalg = np.linalg
+    stub.asnumpy = np.asarray
+    return stub
+
+
+def test_rbf_cupy_backend_matches_numpy(monkeypatch):
+    # more features than _CDIST_MAX_DIM, so both backends take the same
+    # distance computation and only the solve is compared; a wide kernel
+    # makes the design matrix badly conditioned (cond(Z^T Z) ~ 1e13)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 10))
+    y = np.where((X * X).sum(axis=1) > 10, 1., -1.)
+    Mu = X[:20]
+
+    cpu = models.RBFModel(X, y, Mu, r=40)
+    monkeypatch.setattr(models, 'cupy', _numpy_cupy_stub())
+    gpu = models.RBFModel(X, y, Mu, r=40, backend='cupy')
+
+    assert gpu._xp is models.cupy
+    np.testing.assert_allclose(gpu.X, cpu.X)
+    np.testing.assert_allclose(gpu.w, cpu.w, rtol=1e-6)
+    np.testing.assert_array_equal(gpu.classify_all(X), cpu.classify_all(X))